@@ -1,96 +1,259 @@
 import os
+import sys
+import io
+import threading
 import boto3
+from boto3.s3.transfer import TransferConfig
+from botocore.config import Config
 import pandas as pd
-import io
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor, as_completed
+from itertools import islice
 
 from supplierRankingSys import SupplierRankingSystem
 
-s3 = boto3.client(
+
+# Objects above this size are parsed in chunks to keep peak memory bounded
+CHUNKED_READ_THRESHOLD = 200 * 1024 * 1024
+
+# Objects above the multipart threshold are copied with parallel UploadPartCopy
+COPY_TRANSFER_CONFIG = TransferConfig(max_concurrency=16, multipart_threshold=64 * 1024 * 1024)
+
+# Folders moved at once, and objects copied at once within each folder
+MOVE_WORKERS = 4
+COPY_WORKERS = 32
+
+# Multipart copies allowed at once across all movers, each using max_concurrency part threads
+MAX_LARGE_COPIES = 2
+LARGE_COPY_SLOTS = threading.BoundedSemaphore(MAX_LARGE_COPIES)
+
+# Upper bound on concurrent requests: one per copy thread of every mover,
+# plus the part threads of each multipart copy allowed at once
+MAX_POOL_CONNECTIONS = MOVE_WORKERS * COPY_WORKERS + MAX_LARGE_COPIES * COPY_TRANSFER_CONFIG.max_concurrency
+
+
+def create_s3_client():
+    """Create an S3 client from the environment credentials"""
+    return boto3.client(
         "s3",
         aws_access_key_id=os.getenv("AWS_ACCESS_KEY_ID"),
         aws_secret_access_key=os.getenv("AWS_SECRET_ACCESS_KEY"),
-        region_name=os.getenv("AWS_DEFAULT_REGION")
-)
+        region_name=os.getenv("AWS_DEFAULT_REGION"),
+        config=Config(max_pool_connections=MAX_POOL_CONNECTIONS)
+    )
+
+
+s3 = create_s3_client()
 
 bucket_name = os.getenv("S3_BUCKET")
 
+# Local directory holding one subdirectory of report files per processed folder
+REPORTS_DIR = "reports"
+
 def list_folders(bucket):
-    """List top-level folders in the bucket"""
-    response = s3.list_objects_v2(Bucket=bucket, Delimiter="/")
-    prefixes = response.get("CommonPrefixes", [])
-    return [p["Prefix"] for p in prefixes]
+    """Yield top-level folders in the bucket that are still to be processed"""
+    paginator = s3.get_paginator("list_objects_v2")
+    for page in paginator.paginate(Bucket=bucket, Delimiter="/"):
+        for p in page.get("CommonPrefixes", []):
+            if not p["Prefix"].startswith(("done/", "ko/")):
+                yield p["Prefix"]
+
+
+def copy_object(bucket, source_key, target_key, size):
+    """Server-side copy of a single object, returning its source key"""
+    copy_source = {"Bucket": bucket, "Key": source_key}
+    if size > COPY_TRANSFER_CONFIG.multipart_threshold:
+        # Managed copy splits into parts, required above 5 GB. Unlike copy_object it does not
+        # carry over the source's Content-Type and user metadata, so pass them explicitly
+        head = s3.head_object(Bucket=bucket, Key=source_key)
+        extra_args = {"Metadata": head.get("Metadata", {})}
+        if "ContentType" in head:
+            extra_args["ContentType"] = head["ContentType"]
+        with LARGE_COPY_SLOTS:
+            s3.copy(
+                CopySource=copy_source,
+                Bucket=bucket,
+                Key=target_key,
+                ExtraArgs=extra_args,
+                Config=COPY_TRANSFER_CONFIG,
+            )
+    else:
+        s3.copy_object(Bucket=bucket, CopySource=copy_source, Key=target_key)
+    return source_key
+
+
+def delete_objects(bucket, keys):
+    """Delete keys in batches of 1000 (the delete_objects limit)"""
+    errors = []
+    for i in range(0, len(keys), 1000):
+        response = s3.delete_objects(
+            Bucket=bucket,
+            Delete={"Objects": [{"Key": k} for k in keys[i:i + 1000]], "Quiet": True},
+        )
+        # Per-key failures are reported in the response rather than raised
+        errors.extend(response.get("Errors", []))
+
+    if errors:
+        failed = ", ".join(f"{e['Key']} ({e['Code']})" for e in errors)
+        raise RuntimeError(f"Failed to delete {len(errors)} object(s): {failed}")
 
 
 def move_folder(bucket, source_prefix, target_prefix):
-    """Move folder by copying objects then deleting original ones"""
+    """Move folder by copying objects in parallel then batch deleting original ones"""
+    prefix_len = len(source_prefix)
     paginator = s3.get_paginator("list_objects_v2")
     for page in paginator.paginate(Bucket=bucket, Prefix=source_prefix):
-        for obj in page.get("Contents", []):
-            source_key = obj["Key"]
-            target_key = source_key.replace(source_prefix, target_prefix, 1)
+        contents = page.get("Contents", [])
+        if not contents:
+            continue
 
-            s3.copy_object(
-                Bucket=bucket,
-                CopySource={"Bucket": bucket, "Key": source_key},
-                Key=target_key,
-            )
+        copied = []
+        errors = []
+        with ThreadPoolExecutor(max_workers=COPY_WORKERS) as executor:
+            futures = []
+            for obj in contents:
+                source_key = obj["Key"]
+                target_key = target_prefix + source_key[prefix_len:]
+                futures.append(executor.submit(copy_object, bucket, source_key, target_key, obj["Size"]))
 
-            s3.delete_object(Bucket=bucket, Key=source_key)
+            for future in as_completed(futures):
+                try:
+                    copied.append(future.result())
+                except Exception as e:
+                    errors.append(e)
 
+        # Only drop the originals that made it to the target prefix
+        delete_objects(bucket, copied)
+        if errors:
+            raise errors[0]
 
-def read_csv_from_s3(bucket, key, **kwargs):
-    """Read CSV file from S3 into DataFrame"""
-    obj = s3.get_object(Bucket=bucket, Key=key)
-    return pd.read_csv(io.BytesIO(obj["Body"].read()), **kwargs)
 
+def get_objects(bucket, keys):
+    """Fetch several objects concurrently, returning the responses in key order"""
+    with ThreadPoolExecutor(max_workers=len(keys)) as executor:
+        futures = [executor.submit(s3.get_object, Bucket=bucket, Key=key) for key in keys]
+        return [future.result() for future in futures]
 
-def read_txt_from_s3(bucket, key):
-    """Read TXT file from S3 into list of lines"""
-    obj = s3.get_object(Bucket=bucket, Key=key)
-    return obj["Body"].read().decode("utf-8").splitlines()
 
+def parse_csv(obj, **kwargs):
+    """Parse a get_object response as CSV, straight from the response stream"""
+    return pd.read_csv(obj["Body"], **kwargs)
 
-if __name__ == "__main__":
-    folders = list_folders(bucket_name)
 
-    for folder in folders:
-        if folder.startswith("done/") or folder.startswith("ko/"):
-            print(f"⏩ Skipping folder: {folder}")
-            continue
+def parse_csv_chunks(obj, chunksize=500_000, **kwargs):
+    """Parse a get_object response as an iterator of DataFrame chunks"""
+    return pd.read_csv(obj["Body"], chunksize=chunksize, **kwargs)
+
+
+def parse_large_csv(obj, **kwargs):
+    """Parse a get_object response as CSV, in chunks for large objects"""
+    if obj["ContentLength"] <= CHUNKED_READ_THRESHOLD:
+        return parse_csv(obj, **kwargs)
+
+    with parse_csv_chunks(obj, **kwargs) as reader:
+        return pd.concat(list(reader), ignore_index=True, copy=False)
+
+
+def parse_txt(obj):
+    """Yield the non-empty, stripped lines of a get_object response as they stream in"""
+    for line in io.TextIOWrapper(obj["Body"], encoding="utf-8"):
+        line = line.strip()
+        if line:
+            yield line
+
 
-        print(f"Processing folder: {folder}")
+def archive_folder(bucket, folder, succeeded):
+    """Move a processed folder to done/, or to ko/ if it failed or cannot reach done/"""
+    if succeeded:
         try:
-            criteria_configuration_file = folder + "criteria_configuration.csv"
-            df = read_csv_from_s3(bucket_name, criteria_configuration_file, header=None)
-            df = df.dropna(how="all")
+            move_folder(bucket, folder, f"done/{folder}")
+            return
+        except Exception as e:
+            print(f"⚠️ Error moving {folder} to done/: {e}, moving it to ko/")
+    move_folder(bucket, folder, f"ko/{folder}")
+
+
+def init_worker():
+    """Give each worker process its own S3 client (clients are not fork-safe)"""
+    global s3
+    s3 = create_s3_client()
+
+
+def process_folder(folder):
+    """Rank the suppliers of one folder, returning (folder, error or None)"""
+    print(f"Processing folder: {folder}")
+    try:
+        criteria_obj, company_info_obj, data_obj = get_objects(bucket_name, [
+            folder + "criteria_configuration.csv",
+            folder + "company_info.txt",
+            folder + "data.csv",
+        ])
 
-            df = df[[0, 1, 2]]
-            df.columns = ["Criterion", "Weight", "Beneficial"]
+        df = parse_csv(
+            criteria_obj,
+            header=None,
+            skiprows=1,
+            usecols=[0, 1, 2],
+            names=["Criterion", "Weight", "Beneficial"],
+            dtype={"Criterion": "string", "Weight": "string", "Beneficial": "string"},
+        )
+        df = df.dropna(how="all")
+        df["Weight"] = pd.to_numeric(df["Weight"], errors="coerce")
 
-            df = df[df["Criterion"] != "Criterion"]
+        beneficial_mask = (
+            df["Beneficial"].str.strip().str.lower().eq("true").to_numpy(dtype=bool, na_value=False)
+        )
+        criteria = df["Criterion"].to_numpy()
 
-            df["Weight"] = pd.to_numeric(df["Weight"], errors="coerce")
-            df["Beneficial"] = df["Beneficial"].astype(str).str.strip().map({"True": True, "False": False})
+        beneficial = criteria[beneficial_mask].tolist()
+        non_beneficial = criteria[~beneficial_mask].tolist()
+        weights = dict(zip(criteria, df["Weight"].to_numpy()))
 
-            beneficial = df[df["Beneficial"]]["Criterion"].tolist()
-            non_beneficial = df[~df["Beneficial"]]["Criterion"].tolist()
-            weights = dict(zip(df["Criterion"], df["Weight"]))
+        # Only the first three non-empty lines are used, stop reading after them
+        lines = list(islice(parse_txt(company_info_obj), 3))
 
-            company_info_file = folder + "company_info.txt"
-            lines = read_txt_from_s3(bucket_name, company_info_file)
-            lines = [line.strip() for line in lines if line.strip()]
+        company_name = lines[1]
+        contact_email = lines[2]
 
-            company_name = lines[1]
-            contact_email = lines[2]
+        data = parse_large_csv(data_obj)
 
-            data_file = folder + "data.csv"
-            data = read_csv_from_s3(bucket_name, data_file)
+        system = SupplierRankingSystem(beneficial, non_beneficial, weights)
+        # Each folder writes its report files apart, so concurrent batches of one company cannot clash
+        output_dir = os.path.join(REPORTS_DIR, folder)
+        os.makedirs(output_dir, exist_ok=True)
+        system.rank(data, company_name, contact_email, output_dir=output_dir)
+        return folder, None
 
-            system = SupplierRankingSystem(beneficial, non_beneficial, weights)
-            system.rank(data, company_name, contact_email)
+    except Exception as e:
+        return folder, str(e)
 
-            move_folder(bucket_name, folder, f"done/{folder}")
 
+if __name__ == "__main__":
+    moves = {}
+    crashed = []
+    with ProcessPoolExecutor(max_workers=os.cpu_count(), initializer=init_worker) as executor, \
+            ThreadPoolExecutor(max_workers=MOVE_WORKERS) as mover:
+        futures = {executor.submit(process_folder, folder): folder for folder in list_folders(bucket_name)}
+
+        # Moves run in the background while the remaining folders are still being ranked
+        for future in as_completed(futures):
+            try:
+                folder, error = future.result()
+            except Exception as e:
+                # The worker died (e.g. BrokenProcessPool); leave the folder in place to be retried next run
+                crashed.append(futures[future])
+                print(f"⚠️ Worker crashed on {futures[future]}: {e!r}, leaving it for the next run")
+                continue
+            if error is not None:
+                print(f"⚠️ Error on {folder}: {error}")
+            moves[mover.submit(archive_folder, bucket_name, folder, error is None)] = folder
+
+    failed_moves = 0
+    for move, folder in moves.items():
+        try:
+            move.result()
         except Exception as e:
-            print(f"⚠️ Error on {folder}: {e}")
-            move_folder(bucket_name, folder, f"ko/{folder}")
+            failed_moves += 1
+            print(f"⚠️ Error moving {folder}: {e}")
+
+    if failed_moves or crashed:
+        sys.exit(f"{failed_moves} folder(s) could not be moved, {len(crashed)} folder(s) crashed")
@@ -8,47 +8,73 @@ from reportlab.lib.pagesizes import landscape, A4
 from reportlab.lib.units import inch
 from datetime import datetime
 import pandas as pd
-import matplotlib.pyplot as plt
+import matplotlib
+matplotlib.use("Agg")
+from matplotlib.figure import Figure
 import numpy as np
-import tempfile
-import os
+import io
 
 
-def prepare_table(df, font_size=7):
+DEFAULT_TABLE_FONT_SIZE = 7
+
+_TABLE_STYLE = TableStyle([
+    ("BACKGROUND", (0, 0), (-1, 0), colors.HexColor("#2E4053")),
+    ("TEXTCOLOR", (0, 0), (-1, 0), colors.whitesmoke),
+    ("ALIGN", (0, 0), (-1, -1), "CENTER"),
+    ("GRID", (0, 0), (-1, -1), 0.25, colors.grey),
+    ("FONTNAME", (0, 0), (-1, 0), "Helvetica-Bold"),
+    ("FONTSIZE", (0, 0), (-1, -1), DEFAULT_TABLE_FONT_SIZE),
+    ("BOTTOMPADDING", (0, 0), (-1, -1), 2),
+    ("TOPPADDING", (0, 0), (-1, -1), 2),
+    ("ROWBACKGROUNDS", (0, 1), (-1, -1),
+     [colors.white, colors.HexColor("#F2F3F4")]),
+])
+
+
+def prepare_table(df, font_size=DEFAULT_TABLE_FONT_SIZE):
     """Create a compact, styled data table."""
-    data = [df.columns.tolist()] + df.values.tolist()
+    data = [list(df.columns)] + [list(row) for row in df.itertuples(index=False, name=None)]
     col_widths = [4.3 * inch / len(df.columns)] * len(df.columns)
 
     table = Table(data, colWidths=col_widths, hAlign="CENTER")
-    table.setStyle(TableStyle([
-        ("BACKGROUND", (0, 0), (-1, 0), colors.HexColor("#2E4053")),
-        ("TEXTCOLOR", (0, 0), (-1, 0), colors.whitesmoke),
-        ("ALIGN", (0, 0), (-1, -1), "CENTER"),
-        ("GRID", (0, 0), (-1, -1), 0.25, colors.grey),
-        ("FONTNAME", (0, 0), (-1, 0), "Helvetica-Bold"),
-        ("FONTSIZE", (0, 0), (-1, -1), font_size),
-        ("BOTTOMPADDING", (0, 0), (-1, -1), 2),
-        ("TOPPADDING", (0, 0), (-1, -1), 2),
-        ("ROWBACKGROUNDS", (0, 1), (-1, -1),
-         [colors.white, colors.HexColor("#F2F3F4")]),
-    ]))
+    table.setStyle(_TABLE_STYLE)
+    if font_size != DEFAULT_TABLE_FONT_SIZE:
+        table.setStyle([("FONTSIZE", (0, 0), (-1, -1), font_size)])
     return table
 
 
-def split_df(df):
-    """Split dataframe into smaller metric tables."""
-    dfs = {}
-    for col in df.columns[1:-1]:
-        dfs[col] = df[[df.columns[0], col]]
-    return dfs
+def ranked_table(df):
+    """Build a frame with a leading 1-based Rank column from the rows of df."""
+    columns = {"Rank": np.arange(1, len(df) + 1, dtype=np.int32)}
+    columns.update({col: df[col].to_numpy() for col in df.columns})
+    return pd.DataFrame(columns)
+
+
+def smallest_indices(values, k=5):
+    """Return the row indices of the k smallest values, ties kept in row order."""
+    return np.argsort(values, kind="stable")[:k]
 
 
-def create_radar_chart(initial_df, top10_suppliers):
+_radar_axes = None
+
+
+def _get_radar_axes():
+    """Return the shared radar figure and polar axes, cleared for a new chart."""
+    global _radar_axes
+    if _radar_axes is None:
+        fig = Figure(figsize=(9, 6), layout="constrained")
+        _radar_axes = fig, fig.add_subplot(111, polar=True)
+    fig, ax = _radar_axes
+    ax.clear()
+    return fig, ax
+
+
+def create_radar_chart(initial_df, top10_suppliers, name_col, metrics):
     """Generate a radar chart image for top 10 suppliers using their metrics."""
     # Filter for top suppliers
-    radar_data = initial_df[initial_df[initial_df.columns[0]].isin(top10_suppliers)]
+    radar_data = initial_df[initial_df[name_col].isin(top10_suppliers)]
 
-    metrics = list(initial_df.columns[1:-1])
+    metrics = list(metrics)
     num_vars = len(metrics)
 
     # Compute angle for each axis
@@ -56,15 +82,15 @@ def create_radar_chart(initial_df, top10_suppliers):
     angles += angles[:1]  # close the loop
 
     # Create plot
-    plt.figure(figsize=(9, 6))
-    ax = plt.subplot(111, polar=True)
+    fig, ax = _get_radar_axes()
 
     # Draw each supplier’s metrics
-    for _, row in radar_data.iterrows():
-        values = row[metrics].tolist()
-        values += values[:1]  # close loop
-        ax.plot(angles, values, label=row[initial_df.columns[0]], linewidth=1)
-        ax.fill(angles, values, alpha=0.1)
+    values = radar_data[metrics].to_numpy(dtype=np.float32)
+    values = np.concatenate([values, values[:, :1]], axis=1)  # close loop
+    labels = radar_data[name_col].to_numpy()
+    for i in range(len(labels)):
+        ax.plot(angles, values[i], label=labels[i], linewidth=1)
+        ax.fill(angles, values[i], alpha=0.1)
 
     # Format
     ax.set_xticks(angles[:-1])
@@ -74,16 +100,18 @@ def create_radar_chart(initial_df, top10_suppliers):
     ax.set_title("Top 10 Suppliers Radar Chart (from Initial Dataset)", fontsize=12, pad=20)
     ax.legend(loc='upper right', bbox_to_anchor=(1.2, 1.1), fontsize=7)
 
-    # Save temporary image
-    tmp_img = tempfile.NamedTemporaryFile(delete=False, suffix=".png")
-    plt.tight_layout()
-    plt.savefig(tmp_img.name, dpi=150)
-    plt.close()
-    return tmp_img.name
+    # Render image in memory
+    buf = io.BytesIO()
+    fig.savefig(buf, format="png", dpi=100)
+    buf.seek(0)
+    return buf
 
 
 def generate_report(initial_df, perturbation, perturbated_df, report_file):
     """Generate a 3-page professional PDF report (with radar chart on 3rd page)."""
+    name_col = initial_df.columns[0]
+    metrics_cols = initial_df.columns[1:-1]
+
     doc = SimpleDocTemplate(
         report_file,
         pagesize=landscape(A4),
@@ -111,37 +139,27 @@ def generate_report(initial_df, perturbation, perturbated_df, report_file):
     )
 
     # Prepare tables
-    initial_ranking = initial_df[[initial_df.columns[0], initial_df.columns[-1]]].head(10)
-    initial_ranking.insert(0, "Rank", range(1, len(initial_ranking) + 1))
+    initial_ranking = ranked_table(initial_df.iloc[:10, [0, -1]])
     tbl_initial = prepare_table(initial_ranking)
 
-    final_ranking = perturbated_df[[perturbated_df.columns[0], perturbated_df.columns[-1]]].head(10)
-    final_ranking.insert(0, "Rank", range(1, len(final_ranking) + 1))
+    final_ranking = ranked_table(perturbated_df.iloc[:10, [0, -1]])
     tbl_final = prepare_table(final_ranking)
 
-    dfs = split_df(initial_df)
+    metric_values = initial_df[metrics_cols].to_numpy()
     metric_tables = []
-    for col, sub_df in dfs.items():
-        top5 = sub_df.sort_values(by=sub_df.columns[1], ascending=True).head(5)
-        top5.insert(0, "Rank", range(1, len(top5) + 1))
-        metric_tables.append(Paragraph(f"<b>{col}</b>", heading))
-        metric_tables.append(prepare_table(top5))
+    for j, col in enumerate(metrics_cols):
+        idx = smallest_indices(metric_values[:, j])
+        top5 = ranked_table(initial_df.iloc[idx, [0, 1 + j]])
+        metric_tables.append((Paragraph(f"<b>{col}</b>", heading), prepare_table(top5)))
 
-    # Metric grid layout
+    # Metric grid layout: one flat table, each metric is a heading row over its data row
     metric_grid_data = []
     chunk_size = 2
-    for i in range(0, len(metric_tables), chunk_size * 2):
-        row = []
-        for j in range(chunk_size):
-            idx = i + j * 2
-            if idx < len(metric_tables):
-                row.append(Table(
-                    [[metric_tables[idx]], [metric_tables[idx + 1]]],
-                    style=[("ALIGN", (0, 0), (-1, -1), "CENTER")]
-                ))
-            else:
-                row.append("")
-        metric_grid_data.append(row)
+    for i in range(0, len(metric_tables), chunk_size):
+        chunk = metric_tables[i:i + chunk_size]
+        chunk += [("", "")] * (chunk_size - len(chunk))
+        metric_grid_data.append([label for label, _ in chunk])
+        metric_grid_data.append([tbl for _, tbl in chunk])
 
     metric_grid = Table(metric_grid_data, colWidths=[4.5 * inch, 4.5 * inch])
     metric_grid.setStyle(TableStyle([
@@ -149,6 +167,9 @@ def generate_report(initial_df, perturbation, perturbated_df, report_file):
         ("ALIGN", (0, 0), (-1, -1), "CENTER"),
         ("LEFTPADDING", (0, 0), (-1, -1), 4),
         ("RIGHTPADDING", (0, 0), (-1, -1), 4),
+    ] + [
+        # Keep each heading row on the same page as its data row
+        ("NOSPLIT", (0, r), (-1, r + 1)) for r in range(0, len(metric_grid_data), 2)
     ]))
 
     top_grid = Table([
@@ -177,10 +198,10 @@ def generate_report(initial_df, perturbation, perturbated_df, report_file):
 
     # --- PAGE 3 (Radar Chart) ---
     top10_suppliers = perturbated_df.iloc[:10, 0].tolist()
-    radar_path = create_radar_chart(initial_df, top10_suppliers)
+    radar_image = create_radar_chart(initial_df, top10_suppliers, name_col, metrics_cols)
     elements.append(Paragraph("<b>Radar Chart of Top 10 Suppliers After Perturbation</b>", styles["Title"]))
     elements.append(Spacer(1, 12))
-    elements.append(Image(radar_path, width=9 * inch, height=6 * inch))
+    elements.append(Image(radar_image, width=9 * inch, height=6 * inch))
 
     # Footer
     def footer(canvas, doc):
@@ -192,6 +213,3 @@ def generate_report(initial_df, perturbation, perturbated_df, report_file):
         canvas.restoreState()
 
     doc.build(elements, onFirstPage=footer, onLaterPages=footer)
-
-    # Cleanup temp image
-    os.remove(radar_path)
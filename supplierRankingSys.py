@@ -1,10 +1,10 @@
 
+import os
 import pandas as pd
 import numpy as np
 from sklearn.preprocessing import StandardScaler
 from sklearn.ensemble import RandomForestRegressor
 
-import pdfGenerator
 from mailSender import send_email
 from genAi import generate_perturbation
 from rankingUtils import compare_supplier_rankings, calculate_fr
@@ -82,7 +82,7 @@ class SupplierRankingSystem:
 
         return pd.concat(all_comparisons, ignore_index=True).sort_values('Rank_Change', ascending=False)
 
-    def rank(self, df, company, mail):
+    def rank(self, df, company, mail, output_dir="."):
         try:
             result = self.generate_rankings(df)
             if not result.empty:
@@ -105,10 +105,13 @@ class SupplierRankingSystem:
                 perturbation_results = self.analyze_individual_supplier_perturbations(df, result,
                                                                                         perturbation_data)
                 perturbation_results = calculate_fr(perturbation_results)
-                report_file = f'report_{company}.pdf'
+
+                # Deferred: reportlab and matplotlib are only needed once a report is built
+                import pdfGenerator
+                report_file = os.path.join(output_dir, f'report_{company}.pdf')
                 pdfGenerator.generate_report(result, resp , perturbation_results, report_file)
-                perturbation_results_file = f'perturbation_results_{company}.csv'
-                initial_ranking_results_file = f'initial_ranking_results_{company}.csv'
+                perturbation_results_file = os.path.join(output_dir, f'perturbation_results_{company}.csv')
+                initial_ranking_results_file = os.path.join(output_dir, f'initial_ranking_results_{company}.csv')
                 perturbation_results.to_csv(perturbation_results_file, index=False)
                 perturbation_results.to_csv(initial_ranking_results_file, index=False)
                 send_email(mail, [perturbation_results_file, initial_ranking_results_file,report_file])